@@ -57,20 +57,17 @@ except ImportError:
 # if a local.py file is defined, load cfg dict and overwrite environment entries.
 _config_sources = []
 try:
-    from qkit.config.local import cfg_local
-    cfg.update(cfg_local)
-    _config_sources += ["[qkit]src/qkit/config/local.py - cfg_local"]
-    logging.warning("DEPRECATED: Loaded qkit.config.local.py! This has been deprecated in favour of qkit_local_config.py, see README!")
-except ImportError:
-    pass
-
-try:    
-    from qkit.config.local import cfg as cfg_local
-    cfg.update(cfg_local)
-    _config_sources += ["[qkit]src/qkit/config/local.py - cfg"]
-    logging.warning("DEPRECATED: Loaded qkit.config.local.py! This has been deprecated in favour of qkit_local_config.py, see README!")
+    from qkit.config import local as _local_config
 except ImportError:
     pass
+else:
+    # both legacy names 'cfg_local' and 'cfg' are supported, in this order
+    for _name in ('cfg_local', 'cfg'):
+        if hasattr(_local_config, _name):
+            cfg.update(getattr(_local_config, _name))
+            _config_sources += ["[qkit]src/qkit/config/local.py - %s" % _name]
+            logging.warning("DEPRECATED: Loaded qkit.config.local.py! This has been deprecated in favour of qkit_local_config.py, see README!")
+    del _local_config, _name
 
 
 def _load_user_config():
@@ -152,7 +149,19 @@ def start(silent=False):
 
 
 """
-add a few convenience shortcuts 
+add a few convenience shortcuts, subpackages and shortcuts are imported lazily on first access (PEP 562)
 """
-# remote interface client after qkit.start_ric() -> qkit.ric
-from qkit.core.lib.com.ri_client import start_ric
+_lazy_submodules = {'analysis', 'config', 'core', 'drivers', 'gui', 'measure', 'services', 'storage'}
+_lazy_attributes = {'start_ric': 'qkit.core.lib.com.ri_client'}  # remote interface client after qkit.start_ric() -> qkit.ric
+
+
+def __getattr__(name):
+    import importlib
+    if name in _lazy_submodules:
+        value = importlib.import_module('qkit.' + name)
+    elif name in _lazy_attributes:
+        value = getattr(importlib.import_module(_lazy_attributes[name]), name)
+    else:
+        raise AttributeError("module 'qkit' has no attribute '%s'" % name)
+    globals()[name] = value  # cache on the package, so __getattr__ is not called again
+    return value
@@ -193,11 +193,12 @@ class adwin_spin_transistor(Instrument):
         else:
             log.info('Adwin sweeping with no idea, when it ends.')
 
-    def sweep_measure(self, target, duration):
+    def sweep_measure(self, target, duration, dtype=None):
         ''' Start a sweep while measuring with lockin with minimal 
             communication between adwin-PC (buffering the measurement
             in fifo). The sample rate is determined by the lockin
-            process which needs to be already running. '''
+            process which needs to be already running. The data is
+            returned as float64 unless another dtype is given. '''
         # sanity checks
         self._check_measurement_active()
         self._warn_if_fifo_to_small(duration)
@@ -210,13 +211,14 @@ class adwin_spin_transistor(Instrument):
         while self.adw.Get_Par(SWEEP_ACTIVE_PAR) == 1:
             pass
         # fetch measurement data from adwin and return
-        return self._fetch_data_from_fifos()
+        return self._fetch_data_from_fifos(dtype)
 
-    def measure(self, duration):
+    def measure(self, duration, dtype=None):
         ''' Measure DC input for duration with full 500kHz sample rate
             for duration seconds. If no lockin should be applied, start
             lockin process with amplitude zero. Amount of collectable
-            data is limited by fifo buffer length. '''
+            data is limited by fifo buffer length. The data is returned
+            as float64 unless another dtype is given. '''
         # sanity checks
         self._check_measurement_active()
         self._warn_if_fifo_to_small(duration)
@@ -226,16 +228,18 @@ class adwin_spin_transistor(Instrument):
         # disable data aquisition
         self.adw.Set_Par(MEASURE_ACTIVE_PAR, 0)
         # fetch measurement data from adwin and return
-        return self._fetch_data_from_fifos()
+        return self._fetch_data_from_fifos(dtype)
 
-    def _fetch_data_from_fifos(self):
+    def _fetch_data_from_fifos(self, dtype=None):
         ''' Fetch all data from the fifos which has been set as inputs
-            during init_measurement() and clear all other fifos '''
+            during init_measurement() and clear all other fifos. The
+            data is scaled in the given dtype (default: float64). '''
         res = {'inph': None, 'quad': None, 'raw': None}
         samples = self.adw.Fifo_Full(INS['inph'])
         for key in res:
             if key in self._params['inputs']:
                 tmp = self.adw.GetFifo_Float(INS[key], samples)
+                tmp = np.asarray(tmp, dtype=np.float64 if dtype is None else dtype)
                 res[key] = self.aio.bit2qty(tmp, 'readout', False)
             else:
                 self.adw.Fifo_Clear(INS[key])
@@ -70,7 +70,13 @@ def bit2volt(val: int|float|ndarray|list, bits, vrange, absolute):
         case list():
             return [bit2volt(v, bits, vrange, absolute) for v in val]
         case ndarray():
-            return np.vectorize(bit2volt)(val, bits, vrange, absolute)
+            # scale the whole array at once, keeping float32 data float32
+            if val.dtype.kind != 'f':
+                val = val.astype(np.float64)
+            res = val * val.dtype.type(vrange / 2**(bits-1))
+            if absolute:
+                res -= vrange
+            return res
         case _:
             raise AdwinArgumentError
 
@@ -18,31 +18,81 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
 import qkit
-from qkit.services.qplexkit import qplexkit
 from qkit.core.instrument_base import Instrument
 from qkit.config.services import cfg
 import logging
+import io
+import itertools
+import json
+import os
+import pickle
+import socket
 import zmq
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
 
 """ copy docstrings from qplexkit """
-import sys
-from typing import Callable, TypeVar
-if sys.version_info <= (3, 9):
-    from typing_extensions import ParamSpec
-else:
-    from typing import ParamSpec
 
-P = ParamSpec("P")
-T = TypeVar("T")
 
-
-def use_docstring(wrapper: Callable[P, T]):
-    def decorator(func: Callable) -> Callable[P, T]:
-        func.__doc__ = wrapper.__doc__
+def use_docstring(name):
+    """
+    Marks a method to use the docstring of qplexkit.<name>. The docstrings are copied by _copy_docstrings when the
+    first instrument is created, so that the server-side qplexkit module is not imported together with the driver.
+    """
+    def decorator(func):
+        func._docstring_of = name
         return func
     return decorator
 
 
+def _copy_docstrings(cls):
+    from qkit.services.qplexkit.qplexkit import qplexkit
+    for func in vars(cls).values():
+        name = getattr(func, '_docstring_of', None)
+        if name is not None:
+            func.__doc__ = getattr(qplexkit, name).__doc__
+            del func._docstring_of
+
+
+""" RPC stubs of the plain qkit-instrument parameters """
+# (parameter name, cast of the set value, cast of the answer, setter changes the relay states)
+_RPC_PARAMETERS = (('switch_time', None, None, False),
+                   ('current_divider', int, bool, True),
+                   ('amplifier', int, bool, True),
+                   ('current_source_status', int, bool, True),
+                   )
+
+
+def _make_setter(name, cast, invalidates):
+    msg_name, get_key = f'set_{name}', (f'get_{name}', ())
+    text = name.replace('_', ' ')
+
+    def setter(self, val, **kwargs):
+        logging.info(f'{__name__}: set {text} to {val}')
+        if cast is not None:
+            val = cast(val)
+        if invalidates:
+            self.invalidate_cache()
+        ans = self._query((msg_name, (val,), kwargs))
+        if not kwargs:
+            self._cache[get_key] = val  # write-through
+        return ans
+    setter.__name__ = f'do_set_{name}'
+    return use_docstring(msg_name)(setter)
+
+
+def _make_getter(name, cast):
+    msg_name = f'get_{name}'
+
+    def getter(self, **kwargs):
+        ans = self._query_cached((msg_name, (), kwargs))
+        return ans if cast is None else cast(ans)
+    getter.__name__ = f'do_get_{name}'
+    return use_docstring(msg_name)(getter)
+
+
 class qplexkit_client(Instrument):
     """
     This is the driver for the homemade qplexkit. It is the interface to the Raspberry Pi that controls a current
@@ -54,7 +104,7 @@ class qplexkit_client(Instrument):
     <name> = qkit.instruments.create('<name>', 'qplexkit', address=<address>, port=<port>)
     """
 
-    def __init__(self, name, address, port=None):
+    def __init__(self, name, address, port=None, transport='auto'):
         """
         Initializes zmq communication with the qplexkit server running on a Raspberry Pi to control the relays of the
         qplexkit
@@ -67,6 +117,9 @@ class qplexkit_client(Instrument):
             IP-address of Raspberry Pi
         port: int, string
             Port of zeroMQ server
+        transport: string
+            Transport of the zeroMQ connection, 'tcp' or 'ipc'. Default is 'auto', that uses 'ipc' if the server runs
+            on the same machine and provides an ipc-socket (cfg['qplexkit']['ipc_path']) and 'tcp' otherwise.
 
         Returns
         -------
@@ -96,6 +149,7 @@ class qplexkit_client(Instrument):
         >>> qpk = qkit.instruments.create('qpk', 'qplexkit', address='00.00.000.00')
         """
         self.__name__ = __name__
+        _copy_docstrings(type(self))  # before the parameters are added, as they use the docstrings
         # create instrument
         logging.info(f'{__name__}: Initializing instrument qplexkit')
         Instrument.__init__(self, name, tags=['physical'])
@@ -107,8 +161,36 @@ class qplexkit_client(Instrument):
             self._port = self.cfg['server_port']
         else:
             self._port = port
-        self._context = zmq.Context()
-        self.socket = self._context.socket(zmq.REQ)
+        self._ipc_path = self.cfg.get('ipc_path', '/tmp/qplexkit.sock')
+        if transport == 'auto':
+            local = address in ('localhost', '127.0.0.1', socket.gethostname())
+            transport = 'ipc' if local and os.path.exists(self._ipc_path) else 'tcp'
+        elif transport not in ('tcp', 'ipc'):
+            raise ValueError(f'{__name__}: unknown transport {transport}, use "auto", "tcp" or "ipc"')
+        self._transport = transport
+        self._endpoint = self._get_url()
+        # 'pickle', 'msgpack' or 'json' (fallback for older servers), pickle over tcp only if explicitly allowed
+        self._codec = self.cfg.get('codec', 'json')
+        if transport == 'ipc':
+            self._codec = self.cfg.get('ipc_codec', self._codec)
+        elif self._codec == 'pickle' and not self.cfg.get('tcp_pickle', False):
+            raise ValueError(f'{__name__}: codec "pickle" over tcp allows remote code execution, use "msgpack" or '
+                             f'"json" or set cfg["qplexkit"]["tcp_pickle"] = True in a trusted network')
+        if self._codec == 'msgpack':
+            if msgspec is None:
+                raise ImportError(f'{__name__}: codec "msgpack" requires the package msgspec')
+            self._encoder, self._decoder = msgspec.msgpack.Encoder(), msgspec.msgpack.Decoder()
+        self._context = zmq.Context.instance()  # process-wide context shared by all zmq based instruments
+        self.socket = self._context.socket(zmq.DEALER)  # allows to pipeline requests, see send_many
+        self._request_ids = itertools.count()
+        self._timeout = 100000  # wait no longer than 100 second to fail.
+        self._poller = zmq.Poller()  # registered once and reused by every request
+        self._poller.register(self.socket, zmq.POLLIN)
+        self._send_poller = zmq.Poller()
+        self._send_poller.register(self.socket, zmq.POLLOUT)
+        self._send_buf = io.BytesIO()  # reused for pickling every request
+        self._pickler = pickle.Pickler(self._send_buf, protocol=pickle.HIGHEST_PROTOCOL)
+        self._cache = {}  # answers of read-only getters, invalidated by every setter
         self.connect()
 
         ''' qkit-instrument parameters & functions '''
@@ -135,35 +217,53 @@ class qplexkit_client(Instrument):
                            type=bool,
                            flags=Instrument.FLAG_GETSET)
         self.add_function('set_relay')
+        self.add_function('set_relays_batch')
         self.add_function('get_relay')
         self.add_function('get_ccr')
         self.add_function('read_ccr')
         self.add_function('reset')
         self.add_function('get_attr')
 
+    def remove(self):
+        """
+        Closes the zeroMQ socket before the instrument is removed. The shared zmq context is not terminated, as other
+        instruments may still use it.
+        """
+        self.socket.close(linger=0)
+        Instrument.remove(self)
+
+    def _get_url(self, **kwargs):
+        if not kwargs and hasattr(self, '_endpoint'):
+            return self._endpoint  # precomputed default endpoint
+        if self._transport == 'ipc':
+            return f'ipc://{kwargs.get("ipc_path", self._ipc_path)}'
+        return f'tcp://{kwargs.get("address", self._address)}:{kwargs.get("port", self._port)}'
+
     def connect(self, **kwargs):
         try:
-            url = f'''tcp://{kwargs.get('address', self._address)}:{kwargs.get('port', self._port)}'''
+            url = self._get_url(**kwargs)
             logging.info(f'{__name__}: connecting to {url}')
-            self.socket.setsockopt(zmq.RCVTIMEO, 100000)  # wait no longer than 100 second to fail.
+            self.socket.setsockopt(zmq.RCVTIMEO, self._timeout)
+            self.socket.setsockopt(zmq.SNDTIMEO, self._timeout)  # IMMEDIATE blocks sending until connected
             self.socket.setsockopt(zmq.LINGER, 0)
+            self.socket.setsockopt(zmq.IMMEDIATE, 1)  # queue messages only on completed connections
             self.socket.connect(f'{url}')
-            if self._query(("ping", tuple([]), dict({}))) == 'pong':
+            self.invalidate_cache()
+            if self._query(("ping", (), {})) == 'pong':
                 logging.info(f'{__name__}: connection to {url} successfully established')
                 return True
             else:
                 logging.error(f'{__name__}: connection to {url} established, but ping-pong failed. Ensure that the server is running.')
                 return False
         except zmq.error.Again as e:
-            url = f'''tcp://{kwargs.get('address', self._address)}:{kwargs.get('port', self._port)}'''
             logging.error(f'{__name__}: connecting to {url} failed')
             logging.error(f'{__name__}: Server not available or Authenticator failed! {e}')
             return False
 
     def disconnect(self, **kwargs):
-        url = f'''tcp://{kwargs.get('address', self._address)}:{kwargs.get('port', self._port)}'''
+        url = self._get_url(**kwargs)
         logging.info(f'{__name__}: disconnecting {url}')
-        self.socket.disconnect(f'''tcp://{kwargs.get('address', self._address)}:{kwargs.get('port', self._port)}''')
+        self.socket.disconnect(url)
 
     def _query(self, msg):
         """
@@ -171,108 +271,163 @@ class qplexkit_client(Instrument):
 
         parameters
         ----------
-        msg: str
-            Message that is sent to the zeroMQ server running on a Raspberry Pi.
-            The message is dumped via json and encoded as binary-string to be zeroMQ compatible.
+        msg: tuple
+            Message (function name, args, kwargs) that is sent to the zeroMQ server running on a Raspberry Pi.
+            The message is dumped via msgpack or json (cfg['qplexkit']['codec']), or via pickle over the ipc-socket
+            (cfg['qplexkit']['ipc_codec']) as binary-string to be zeroMQ compatible.
 
         returns
         -------
         ans: str
             Answer that is returned to the queried message <msg>.
         """
-        self.socket.send_json(msg)
-        ans = self.socket.recv_json()
-        if type(ans) is list:
-            if type(ans[0]) is str:
-                if 'error' in ans[0].lower():
-                    raise Exception(ans)
-        return ans
+        return self.send_many([msg])[0]
 
-    @use_docstring(qplexkit.qplexkit.set_switch_time)
-    def do_set_switch_time(self, val):
-        logging.info(f'''{__name__}: set switch time to {val}s''')
-        msg = ("set_switch_time", tuple([val]), dict({}))
-        return self._query(msg)
+    def _send(self, frames):
+        # wait no longer than the timeout until the socket can send, like for the answers
+        if not self._send_poller.poll(self._timeout):
+            raise zmq.error.Again()
+        self.socket.send_multipart(frames, flags=zmq.NOBLOCK)
 
-    @use_docstring(qplexkit.qplexkit.get_switch_time)
-    def do_get_switch_time(self):
-        msg = ("get_switch_time", tuple([]), dict({}))
-        return self._query(msg)
+    def send_many(self, msgs):
+        """
+        Sends all messages <msgs> at once and returns the read answers <ans> in the same order. The requests are
+        pipelined, i.e. only one round-trip is waited for instead of one per message.
 
-    @use_docstring(qplexkit.qplexkit.set_experiment)
+        parameters
+        ----------
+        msgs: list of tuple
+            Messages (function name, args, kwargs) that are sent to the zeroMQ server running on a Raspberry Pi.
+
+        returns
+        -------
+        ans: list
+            Answers that are returned to the queried messages <msgs>.
+        """
+        pending = {}
+        for i, msg in enumerate(msgs):
+            request_id = str(next(self._request_ids)).encode()
+            pending[request_id] = i
+            # the request id is an envelope frame that is returned unchanged by the REP socket of the server
+            if self._codec == 'pickle':
+                self._send_buf.seek(0)
+                self._send_buf.truncate()
+                self._pickler.clear_memo()
+                self._pickler.dump(msg)
+                with self._send_buf.getbuffer() as payload:  # release the buffer before it is reused
+                    self._send([request_id, b'', payload])
+            elif self._codec == 'msgpack':
+                self._send([request_id, b'', self._encoder.encode(msg)])
+            else:
+                self._send([request_id, b'', json.dumps(msg).encode()])
+        answers = [None] * len(msgs)
+        while pending:
+            if not self._poller.poll(self._timeout):
+                raise zmq.error.Again()
+            request_id, _, payload = self.socket.recv_multipart(copy=False)
+            i = pending.pop(request_id.bytes, None)
+            if i is None:  # late answer of a previously timed out request
+                continue
+            if self._codec == 'pickle':
+                answers[i] = pickle.loads(payload.buffer)
+            elif self._codec == 'msgpack':
+                answers[i] = self._decoder.decode(payload.buffer)
+            else:
+                answers[i] = json.loads(payload.bytes)
+        for ans in answers:
+            if type(ans) in (list, tuple) and ans:
+                if type(ans[0]) is str:
+                    if 'error' in ans[0].lower():
+                        raise Exception(ans)
+        return answers
+
+    def _query_cached(self, msg):
+        """
+        Like _query, but the answer <ans> of read-only getters is cached until the next setter is called. Messages
+        with keyword arguments (e.g. a specific condition code register <ccr>) always query the server.
+        """
+        if msg[2]:
+            return self._query(msg)
+        key = msg[:2]
+        try:
+            return self._cache[key]
+        except KeyError:
+            ans = self._cache[key] = self._query(msg)
+            return ans
+
+    def invalidate_cache(self):
+        """
+        Clears the cached answers of the read-only getters. Call this if the qplexkit was changed by another client.
+        """
+        self._cache.clear()
+
+    @use_docstring('set_experiment')
     def do_set_experiment(self, exp, protect=False, **kwargs):
         logging.info(f'''{__name__}: set experiment to {exp}''')
-        msg = ("set_experiment", tuple([exp, protect]), dict(kwargs))
+        msg = ("set_experiment", (exp, protect), dict(kwargs))
+        self.invalidate_cache()
         return self._query(msg)
 
-    @use_docstring(qplexkit.qplexkit.get_experiment)
+    @use_docstring('get_experiment')
     def do_get_experiment(self, **kwargs):
-        msg = ("get_experiment", tuple([]), dict(kwargs))
-        return self._query(msg)
+        msg = ("get_experiment", (), dict(kwargs))
+        return self._query_cached(msg)
 
-    @use_docstring(qplexkit.qplexkit.set_current_divider)
-    def do_set_current_divider(self, status, **kwargs):
-        logging.info(f'''{__name__}: set current divider to {status}''')
-        msg = ("set_current_divider", tuple([int(status)]), dict(kwargs))
-        return self._query(msg)
-
-    @use_docstring(qplexkit.qplexkit.get_current_divider)
-    def do_get_current_divider(self, **kwargs):
-        msg = ("get_current_divider", tuple([]), dict(kwargs))
-        return bool(self._query(msg))
-
-    @use_docstring(qplexkit.qplexkit.set_amplifier)
-    def do_set_amplifier(self, status, **kwargs):
-        logging.info(f'''{__name__}: set amplifier to {status}''')
-        msg = ("set_amplifier", tuple([int(status)]), dict(kwargs))
+    @use_docstring('set_relay')
+    def set_relay(self, rel, status, **kwargs):
+        logging.info(f'''{__name__}: set relay {rel} to {status}''')
+        msg = ("set_relay", (rel, int(status)), dict(kwargs))
+        self.invalidate_cache()
         return self._query(msg)
 
-    @use_docstring(qplexkit.qplexkit.get_amplifier)
-    def do_get_amplifier(self, **kwargs):
-        msg = ("get_amplifier", tuple([]), dict(kwargs))
-        return bool(self._query(msg))
-
-    @use_docstring(qplexkit.qplexkit.set_current_source_status)
-    def do_set_current_source_status(self, status, **kwargs):
-        logging.info(f'''{__name__}: set current source status to {status}''')
-        msg = ("set_current_source_status", tuple([int(status)]), dict(kwargs))
-        return self._query(msg)
+    def set_relays_batch(self, relays, **kwargs):
+        """
+        Sets several relays at once, where the requests are pipelined to the server.
 
-    @use_docstring(qplexkit.qplexkit.get_current_source_status)
-    def do_get_current_source_status(self, **kwargs):
-        msg = ("get_current_source_status", tuple([]), dict(kwargs))
-        return bool(self._query(msg))
+        Parameters
+        ----------
+        relays: dict
+            Relay numbers as keys and relay status as values.
+        **kwargs:
+            Keyword arguments that are passed to each set_relay call.
 
-    @use_docstring(qplexkit.qplexkit.set_relay)
-    def set_relay(self, rel, status, **kwargs):
-        logging.info(f'''{__name__}: set relay {rel} to {status}''')
-        msg = ("set_relay", tuple([rel, int(status)]), dict(kwargs))
-        return self._query(msg)
+        Returns
+        -------
+        ans: list
+            Answers of the single set_relay calls.
+        """
+        logging.info(f'''{__name__}: set relays {relays}''')
+        msgs = [("set_relay", (rel, int(status)), dict(kwargs)) for rel, status in relays.items()]
+        self.invalidate_cache()
+        return self.send_many(msgs)
 
-    @use_docstring(qplexkit.qplexkit.get_relay)
+    @use_docstring('get_relay')
     def get_relay(self, rel, **kwargs):
-        msg = ("get_relay", tuple([rel]), dict(kwargs))
-        return bool(self._query(msg))
+        msg = ("get_relay", (rel,), dict(kwargs))
+        return bool(self._query_cached(msg))
 
-    @use_docstring(qplexkit.qplexkit.get_relays)
+    @use_docstring('get_relays')
     def do_get_relays(self, **kwargs):
-        msg = ("get_relays", tuple([]), dict(kwargs))
-        return self._query(msg)
+        msg = ("get_relays", (), dict(kwargs))
+        return self._query_cached(msg)
 
-    @use_docstring(qplexkit.qplexkit.get_ccr)
+    @use_docstring('get_ccr')
     def get_ccr(self, rel, **kwargs):
-        msg = ("get_ccr", tuple([rel]), dict(kwargs))
-        return self._query(msg)
+        msg = ("get_ccr", (rel,), dict(kwargs))
+        return self._query_cached(msg)
 
-    @use_docstring(qplexkit.qplexkit.read_ccr)
+    @use_docstring('read_ccr')
     def read_ccr(self, n=-1, timestamp=False, **kwargs):
-        msg = ("read_ccr", tuple([n, timestamp]), dict(kwargs))
-        return self._query(msg)
+        msg = ("read_ccr", (n, timestamp), dict(kwargs))
+        if n != -1:  # previous entries of the register are not cached
+            return self._query(msg)
+        return self._query_cached(msg)
 
-    @use_docstring(qplexkit.qplexkit.reset)
+    @use_docstring('reset')
     def reset(self):
         logging.info(f'''{__name__}: reset qplexkit by setting all relays to 0 which corresponds to experiment 0''')
-        msg = ("reset", tuple([]), dict({}))
+        msg = ("reset", (), {})
+        self.invalidate_cache()
         return self._query(msg)
 
     def get_attr(self, attr):
@@ -289,6 +444,11 @@ class qplexkit_client(Instrument):
         val:
             Value of the class attribute.
         """
-        msg = ("get_attr", tuple([attr]), dict({}))
+        msg = ("get_attr", (attr,), {})
         return self._query(msg)
 
+
+for _name, _set_cast, _get_cast, _invalidates in _RPC_PARAMETERS:
+    setattr(qplexkit_client, f'do_set_{_name}', _make_setter(_name, _set_cast, _invalidates))
+    setattr(qplexkit_client, f'do_get_{_name}', _make_getter(_name, _get_cast))
+del _name, _set_cast, _get_cast, _invalidates
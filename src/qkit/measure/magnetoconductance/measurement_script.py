@@ -45,6 +45,8 @@
                     *traces and inputs in "plot" will automatically be added to save,
                     cause its required to save the data to plot it with qviewkit.
                     *additional inputs: amp, phase (inph, quad needed for calculation)
+                    *optional: flush_interval (default=1, number of traces of a 2D measurement
+                    written to the .h/hdf5 file at once)
 
     *Optional keywords:
         -h5_path:   *path of .h/hdf5 file to extract and load measurement config
@@ -58,23 +60,78 @@
 '''
 #imports
 import logging as log
+import math
+import sys
 import numpy as np
 import json
 import time
 import h5py
+try:
+    import numba
+except ImportError:
+    numba = None
 import qkit
 from qkit.measure.magnetoconductance.spin_tune_ST import Tuning_ST
 from qkit.measure.magnetoconductance.working_point import WorkingPoint
 from qkit.drivers.adwin_spin_transistor import adwin_spin_transistor
 
 
-def calc_r(x, y):
+def calc_r(x, y, out=None):
     ''' calc func for amplitude from lockin'''
-    return np.sqrt(np.square(x) + np.square(y))
+    return np.hypot(x, y, out=out)
 
-def calc_theta(x, y):
+def calc_theta(x, y, out=None):
     ''' calc func for phase shift from lockin'''
-    return np.arctan2(y, x)
+    return np.arctan2(y, x, out=out)
+
+def _deep_extend(dst, src):
+    ''' extend the lists of the nested dict dst by the lists of src'''
+    for key, val in src.items():
+        if isinstance(val, dict):
+            _deep_extend(dst[key], val)
+        else:
+            dst[key].extend(val)
+
+# rows of the fused lockin calculation
+LOCKIN_ROWS = ('inph_difference','quad_difference','amp_trace','amp_retrace','amp_difference',
+               'phase_trace','phase_retrace','phase_difference')
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True, fastmath=True)
+    def _reduce_lockin(inph_t, inph_r, quad_t, quad_r, out, mask):
+        ''' calc func for the lockin data of a sweep in one pass, the retrace is
+        given in measured order; mask selects the rows of out (see LOCKIN_ROWS)'''
+        n = out.shape[1]
+        for i in numba.prange(n):
+            it, qt = inph_t[i], quad_t[i]
+            ir, qr = inph_r[n-1-i], quad_r[n-1-i]
+            if mask[0]:
+                out[0, i] = ir - it
+            if mask[1]:
+                out[1, i] = qr - qt
+            if mask[2] or mask[3] or mask[4]:
+                at, ar = math.hypot(it, qt), math.hypot(ir, qr)
+                out[2, i], out[3, i], out[4, i] = at, ar, ar - at
+            if mask[5] or mask[6] or mask[7]:
+                pt, pr = math.atan2(qt, it), math.atan2(qr, ir)
+                out[5, i], out[6, i], out[7, i] = pt, pr, pr - pt
+else:
+    _reduce_lockin = None
+
+# valid values of the params, shared by all scripts
+VALID_STEP_VARS = frozenset({'vg','vd','N','bt','bp','phi','psi','theta'})
+VALID_SWEEP_VARS = frozenset({'vg','vd','bt','bp','phi','psi','theta'})
+VALID_WP_MODES = frozenset({'normal','sweep'})
+VALID_MEASURE_MODES = frozenset({'static','sweep'})     # static mode not availible yet
+VALID_INPUTS = frozenset({'raw','inph','quad'})
+VALID_TRACES = frozenset({'trace','retrace','difference'})
+VALID_CALC = frozenset({'amp','phase'})
+VALID_DATA = VALID_INPUTS | VALID_CALC
+VALIDS = {'step':VALID_STEP_VARS,'sweep':VALID_SWEEP_VARS,
+          'wp':VALID_WP_MODES,'measure':VALID_MEASURE_MODES,
+          'traces':VALID_TRACES,'inputs':VALID_INPUTS,'calc':VALID_CALC}
+MAX_RATE_CONFIG = {'bx':0.1,'by':0.1,'bz':0.1,'bp':0.1,'bt':0.1,'vg':0.1,'vd':0.1} # rate in T(/V) per sec
+UNITS = {'inph':'S','quad':'S','raw':'V','amp':'S','phase':'rad'}
 
 class MeasurementScript():
     ''' The Measurement Script generates a 
@@ -98,19 +155,8 @@ class MeasurementScript():
 
     def def_valids(self):
         ''' define validations'''
-        self.valid_step_vars = ['vg','vd','N','bt','bp','phi','psi','theta']
-        self.valid_sweep_vars = ['vg','vd','bt','bp','phi','psi','theta']
-        self.valid_wp_mode = ['normal','sweep']
-        self.valid_measure_mode = ['static','sweep']        # static mode not availible yet
-        self.valid_inputs = ['raw','inph','quad']
-        self.valid_traces = ['trace','retrace','difference']
-        self.valid_calc = ['amp','phase']
-        self.max_rate_config = {'bx':0.1,'by':0.1,'bz':0.1,'bp':0.1,'bt':0.1,'vg':0.1,'vd':0.1} # rate in T(/V) per sec
-        self.unit = {'inph':'S','quad':'S','raw':'V','amp':'S','phase':'rad'}
-        self.valids = {'step':self.valid_step_vars,'sweep':self.valid_sweep_vars,
-                        'wp':self.valid_wp_mode,'measure':self.valid_measure_mode,
-                        'traces':self.valid_traces,'inputs':self.valid_inputs,
-                        'calc':self.valid_calc,'maxrate':self.max_rate_config}
+        self.max_rate_config = dict(MAX_RATE_CONFIG)   # copy, the max rates can be adjusted per script
+        self.valids = {**VALIDS, 'maxrate':self.max_rate_config}
 
     def setup_params(self):
         ''' setup params for the measurement'''
@@ -128,7 +174,13 @@ class MeasurementScript():
                         'save':{'inph':[],'quad':[],'raw':[],
                                 'amp':[],'phase':[]},
                         'plot':{'inph':[],'quad':[],'raw':[],
-                                'amp':[],'phase':[]}}
+                                'amp':[],'phase':[]},
+                        'flush_interval':1}     # number of traces written to the .h5 file at once
+        self._calc_buffers = {}     # output arrays of amp and phase, reused (overwritten) by every sweep
+        self._sweep_cache_key = None    # params the sweep/step values were generated with
+        self._step_cache_key = None
+        self._sweep_samples = None      # number of samples of a sweep, read from adwin at the first sweep
+        self.contiguous_output = False  # True, if the consumer of sweep_measure needs C-contiguous arrays
 
     def def_setter(self):
         ''' define setter functions of params'''
@@ -142,6 +194,7 @@ class MeasurementScript():
         self.create_output_channel()# create output channel for adwin
         self.add_saves()            # generate data save and temp_save dicts
         self.add_inputs()           # generate ADwin inputs
+        self.create_plan()          # precompute data processing of each sweep
         self.start_lockin()         # start lockin signal
         self.update_lockin()        # get real lockin data from adwin
 
@@ -186,22 +239,28 @@ class MeasurementScript():
         ''' creates instance of class Tuning_ST(Tuning)'''
         self.tune = Tuning_ST()
         self.tune.qviewkit_singleInstance = True
+        self.tune.flush_interval = self._data['flush_interval']
 
     def create_output_channel(self):
         ''' create output channel dictionary'''
         self.outs = {key: val['channel'] for key, val in self.hard_config['outputs'].items()}
+        # order (as in outs_array of the wps), adwin channel index and max rate of the outputs
+        self._outs_order = list(self.outs.keys())
+        self._chan_idx = np.array([self.outs[key]-1 for key in self._outs_order])
+        self._maxrate_vec = np.array([self.valids['maxrate'][key] for key in self._outs_order], dtype=np.float64)
+
+    def _ramp_duration(self, target, start):
+        ''' minimal duration to ramp all outputs from start to target with their max rates,
+        outputs with undefined (NaN) values are ignored'''
+        durations = np.abs(target - start) / self._maxrate_vec
+        return float(np.max(durations, initial=0, where=~np.isnan(durations)))
 
     def show_plots(self):
         ''' create list of datasets to plot'''
-        plotted_data = []
+        self.plots = None
         if self._modes['measure'] == 'sweep':
-            for key, val in self._data['plot'].items():
-                for key1 in val:
-                        plotted_data.append(f'sweep_measure.{key}_{key1}')
-        if plotted_data:
-            self.plots = plotted_data
-        else:
-            self.plots = None
+            self.plots = tuple(sys.intern(f'sweep_measure.{key}_{key1}')
+                               for key, val in self._data['plot'].items() for key1 in val) or None
 
     def start_measurement(self):
         ''' start activated measurement'''
@@ -211,24 +270,20 @@ class MeasurementScript():
         elif self.dim == 2:
             self.tune.measure2D(self.plots)
         else:
-            assert ModuleNotFoundError
+            raise NotImplementedError(f'{self.dim}D measurement is not implemented!')
 
     def add_view(self):
         ''' adds 1D views'''
-        for key in self.inputs_dict.keys():
-            if 'retrace' in key:
-                if self.dim == 2:
-                    view = self.datafile.add_view(name=key.replace("_retrace",""),x=self.coordinates[self._y_parameter.name],y=self.datasets['sweep_measure.'+key])
-                    view.add(x=self.coordinates[self._y_parameter.name], y=self.datasets['sweep_measure.'+key.replace("retrace","trace")])
-                else:
-                    view = self.datafile.add_view(name=key.replace("_retrace",""), x=self.coordinates[self._x_parameter.name], y=self.datasets['sweep_measure.'+key])
-                    view.add(x=self.coordinates[self._x_parameter.name], y=self.datasets['sweep_measure.'+key.replace("retrace","trace")])
-            if 'difference' in key:
-                if self.dim == 2:
-                    view = self.datafile.add_view(name=key, x=self.coordinates[self._y_parameter.name], y=self.datasets['sweep_measure.'+key])
-                else:
-                    view = self.datafile.add_view(name=key, x=self.coordinates[self._x_parameter.name], y=self.datasets['sweep_measure.'+key])
-        if 'amp_difference' in self.inputs_dict.keys():
+        if self.dim == 2:
+            x = self.coordinates[self._y_parameter.name]
+        else:
+            x = self.coordinates[self._x_parameter.name]
+        for key, key1 in self._retrace_pairs:       # retrace with trace in one view
+            view = self.datafile.add_view(name=key.replace("_retrace",""), x=x, y=self.datasets['sweep_measure.'+key])
+            view.add(x=x, y=self.datasets['sweep_measure.'+key1])
+        for key in self._difference_keys:
+            view = self.datafile.add_view(name=key, x=x, y=self.datasets['sweep_measure.'+key])
+        if 'amp_difference' in self.inputs_dict.keys() and self.dim == 2:
             if 'deg' in self._step.get('unit') or '°' in self._step.get('unit'):
                 view = self.datafile.add_polarview(name='polar_colormap', x=self.coordinates[self._x_parameter.name], y=self.coordinates[self._y_parameter.name], z=self.datasets['sweep_measure.amp_difference'])
 
@@ -254,12 +309,8 @@ class MeasurementScript():
 
     def start_sweep(self):
         ''' start sweep from adwin outputs to the first wp of the measurement'''
-        outs_start = self.get_wp()
-        start_time=0
-        for key,val in self.wp_start.outs.items():
-            duration = abs(val - outs_start[self.hard_config['outputs'][key]['channel']-1])/self.valids['maxrate'][key]
-            if start_time < duration:
-                start_time = duration
+        outs_start = np.asarray(self.get_wp(), dtype=np.float64)
+        start_time = self._ramp_duration(self.wp_start.outs_array, outs_start[self._chan_idx])
         log.info(f"Sweeping to start working point! Sweep durtion is {round(start_time,2)}s")
         self.ramp_to_wp(dt=start_time)
         time.sleep(5)
@@ -280,6 +331,7 @@ class MeasurementScript():
         else:
             log.warning("No lockin signal applied!")
             self.stop_lockin()
+        self._sweep_samples = None      # read again at the next sweep
         time.sleep(1)
 
     def stop_lockin(self):
@@ -288,78 +340,85 @@ class MeasurementScript():
                                     amplitude=0, frequency=100, tao=1/100)
 
     def sweep_measure(self):
-        ''' measure sweep and generate data dict'''
+        ''' measure sweep and generate data dict {name: values}.
+        The calculated values (differences, amp, phase and lockin data) are views of buffers that are reused and
+        overwritten by the next call, copy them to keep the data of a sweep. Retrace data are reversed views.'''
         trace,retrace=None,None
-        trace = self.anna.sweep_measure(self.wp_stop.outs, duration=self._sweep['duration'])
+        trace = self.anna.sweep_measure(self.wp_stop.outs, duration=self._sweep['duration'], dtype=np.float32)
         if self._inputs['retrace']:
-            retrace = self.anna.sweep_measure(self.wp_start.outs, duration=self._sweep['duration'])
-        sample_rate = int(self.anna.adw.Get_FPar(26)*self.anna.adw.Get_FPar(21))
+            retrace = self.anna.sweep_measure(self.wp_start.outs, duration=self._sweep['duration'], dtype=np.float32)
+        if self._sweep_samples is None:
+            # real sample rate of the lockin times real duration of the sweep, only read after the first sweep
+            self._sweep_samples = int(self._lockin['sample_rate']*self.anna.adw.Get_FPar(21))
+        sample_rate = self._sweep_samples
+        traces = {'trace':trace, 'retrace':retrace}
         values_dict = {}    # dictionary contains all the data required to calculate the data to be saved
-        for key,val in self._data['temp_save'].items():
-            if val:
-                if key in self.valid_inputs:                        # inph, quad and raw data
-                    tr, rt, diff = [], [], []
-                    for key1 in val:
-                        if key1 == 'trace':
-                            tr = trace[key].astype(np.float32)[:sample_rate]
-                        elif key1 == 'retrace':
-                            rt = np.flip(retrace[key].astype(np.float32)[:sample_rate])
-                    if 'difference' in val:
-                        if isinstance(tr, np.ndarray) and isinstance(rt, np.ndarray):
-                            diff = rt - tr
-                        else:
-                            assert ValueError
-                    if isinstance(tr, np.ndarray):
-                        values_dict[f'{key}_trace']=tr
-                    if isinstance(rt, np.ndarray):
-                        values_dict[f'{key}_retrace']=rt
-                    if isinstance(diff, np.ndarray):
-                        values_dict[f'{key}_difference']=diff
-        for key,val in self._data['temp_save'].items():             # amp and phase data calculation
-            if val:
-                if key in self.valid_calc:
-                    amp, phase = {'trace':[],'retrace':[],'difference':[]}, {'trace':[],'retrace':[],'difference':[]}
-                    for key1 in val:
-                        if (values_dict.get(f'inph_{key1}') is not None) and (values_dict.get(f'quad_{key1}') is not None):
-                            if key == 'amp':
-                                amp[key1] = calc_r(values_dict.get(f'inph_{key1}'), values_dict.get(f'quad_{key1}'))
-                            elif key == 'phase':
-                                phase[key1] = calc_theta(values_dict.get(f'inph_{key1}'), values_dict.get(f'quad_{key1}'))
-                            else:
-                                assert KeyError
-                        else:
-                            assert ValueError
-                    if 'difference' in val:
-                        if key == 'amp':
-                            if isinstance(amp['trace'],np.ndarray) and isinstance(amp['retrace'],np.ndarray):
-                                amp[key1] = amp.get('retrace') - amp.get('trace')
-                            else:
-                                assert ValueError
-                        elif key == 'phase':
-                            if isinstance(phase['trace'],np.ndarray) and isinstance(phase['retrace'],np.ndarray):
-                                phase[key1] = phase.get('retrace') - phase.get('trace')
-                            else:
-                                assert ValueError
-                        else:
-                            assert KeyError
-                    for key1,val1 in amp.items():
-                        if isinstance(val1, np.ndarray):
-                            values_dict[f'{key}_{key1}']=val1
-                    for key1,val1 in phase.items():
-                        if isinstance(val1, np.ndarray):
-                            values_dict[f'{key}_{key1}']=val1
-        save_dict = {}      # dictionary with the data to be saved
-        for key, val in self._data['save'].items():
-            for key1 in val:
-                save_dict[f'{key}_{key1}'] = values_dict[f'{key}_{key1}']
-        return save_dict
+        for key, saves in self._save_keys_by_src.items():          # inph, quad and raw data
+            for key1, name in saves:
+                values = traces[key1][key][:sample_rate]
+                values_dict[name] = values[::-1] if key1 == 'retrace' else values   # reversed view, no copy
+        if self._lockin_rows:                                       # fused lockin calculation (numba)
+            inph_t, quad_t = values_dict['inph_trace'], values_dict['quad_trace']
+            inph_r, quad_r = values_dict['inph_retrace'][::-1], values_dict['quad_retrace'][::-1]
+            if not inph_t.shape == quad_t.shape == inph_r.shape == quad_r.shape:
+                raise ValueError('Traces of inph and quad differ in length!')
+            out = self._calc_buffer('lockin', (len(LOCKIN_ROWS), len(inph_t)), inph_t.dtype)
+            _reduce_lockin(inph_t, inph_r, quad_t, quad_r, out, self._lockin_mask)
+            for row, name in self._lockin_rows:
+                values_dict[name] = out[row]
+        for name1, name2, name, func in self._plan_calc:           # differences, amp and phase
+            values = values_dict[name1]
+            values_dict[name] = func(values, values_dict[name2],
+                                     out=self._calc_buffer(name, values.shape, values.dtype))
+        if self.contiguous_output:
+            return {name: np.ascontiguousarray(values_dict[name]) if view else values_dict[name]
+                    for name, view in self._plan_save}
+        return {name: values_dict[name] for name, _ in self._plan_save}
+
+    def _calc_buffer(self, name, shape, dtype):
+        ''' output buffer of calculated data, which is reused for every sweep'''
+        buf = self._calc_buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = self._calc_buffers[name] = np.empty(shape, dtype)
+        return buf
+
+    def create_plan(self):
+        ''' precompute the data processing of each sweep from temp_save:
+        needed traces of each adwin input {input: [(trace/retrace, name)]},
+        calculations (name1, name2, name, func) and names of the data to be saved'''
+        temp_save = self._data['temp_save']
+        self._save_keys_by_src = {key: [(key1, f'{key}_{key1}') for key1 in ['trace','retrace'] if key1 in temp_save[key]]
+                                  for key in temp_save if key in VALID_INPUTS and temp_save[key]}
+        self._plan_calc = [(f'{key}_retrace', f'{key}_trace', f'{key}_difference', np.subtract)
+                           for key in temp_save if key in VALID_INPUTS and 'difference' in temp_save[key]]
+        # amp and phase of one trace are calculated back-to-back, while inph and quad are still cached
+        for key1 in ['trace','retrace']:
+            for key, func in [('amp', calc_r), ('phase', calc_theta)]:
+                if key1 in temp_save[key]:
+                    self._plan_calc.append((f'inph_{key1}', f'quad_{key1}', f'{key}_{key1}', func))
+        self._plan_calc += [(f'{key}_retrace', f'{key}_trace', f'{key}_difference', np.subtract)
+                            for key in temp_save if key in VALID_CALC and 'difference' in temp_save[key]]
+        # only the retraces of the adwin inputs are reversed views, which are copied if C-contiguous data is required
+        self._plan_save = [(f'{key}_{key1}', key in VALID_INPUTS and key1 == 'retrace')
+                           for key, val in self._data['save'].items() for key1 in val]
+        # with numba the lockin calculations run in one fused pass, if trace and retrace of inph and quad are measured
+        self._lockin_mask, self._lockin_rows = None, []
+        if _reduce_lockin is not None and all(key1 in temp_save[key] for key in ['inph','quad']
+                                              for key1 in ['trace','retrace']):
+            names = {name for _, _, name, _ in self._plan_calc}
+            self._lockin_mask = np.array([name in names for name in LOCKIN_ROWS])
+            self._lockin_rows = [(row, name) for row, name in enumerate(LOCKIN_ROWS) if name in names]
+            self._plan_calc = [entry for entry in self._plan_calc if entry[2] not in names.intersection(LOCKIN_ROWS)]
 
     def create_inputs(self):
         ''' create dictionary for measurement inputs with unit'''
         self.inputs_dict = {}
         for key, val in self._data['save'].items():
             for key1 in val:
-                self.inputs_dict[f'{key}_{key1}'] = self.unit[key]
+                self.inputs_dict[f'{key}_{key1}'] = UNITS[key]
+        # saved retraces with their traces and saved differences, for the views
+        self._retrace_pairs = [(key, key.replace('retrace','trace')) for key in self.inputs_dict if key.endswith('_retrace')]
+        self._difference_keys = [key for key in self.inputs_dict if key.endswith('_difference')]
 
     def register_measurement(self):
         ''' register measurement with needed data input dict'''
@@ -415,17 +474,14 @@ class MeasurementScript():
 
     def wp_setter(self, x=None, dt=None):
         ''' set new step val of step var for wp'''
+        # copy of the current outputs, the outs of the wps are updated in place
         if self._inputs['retrace']:
-            temp_wp_outs=self.wp_start.outs
+            temp_wp_outs = self.wp_start.outs_array.copy()
         else:
-            temp_wp_outs=self.wp_stop.outs
+            temp_wp_outs = self.wp_stop.outs_array.copy()
         self.set_start_wp(**{self._step['name']:x})
         self.set_stop_wp(**{self._step['name']:x})
-        min_duration=0
-        for key,val in self.wp_start.outs.items():
-            duration = abs(val - temp_wp_outs[key])/self.max_rate_config[key]
-            if min_duration < duration:
-                min_duration = duration
+        min_duration = self._ramp_duration(self.wp_start.outs_array, temp_wp_outs)
         if dt is None:
             dt = min_duration
         elif dt<min_duration:
@@ -436,8 +492,15 @@ class MeasurementScript():
     def generate_steps(self):
         ''' generate steps for step variable if possible'''
         if (self._step['start'] is not None and self._step['stop'] is not None and self._step['step_size'] is not None):
-            self._step['values'] = np.arange(self._step['start'], self._step['stop']+self._step['step_size'],
-                                            self._step['step_size'],dtype=np.float32)
+            cache_key = (self._step['start'], self._step['stop'], self._step['step_size'])
+            if self._step['values'] is None or cache_key != self._step_cache_key:
+                span = abs(self._step['stop']-self._step['start'])
+                steps = round(span/abs(self._step['step_size']))
+                if abs(steps*abs(self._step['step_size']) - span) > 1e-6*max(span, abs(self._step['step_size'])):
+                    log.warning(f"Step size {self._step['step_size']} does not fit between start and stop! "
+                                f"Using {steps+1} equidistant steps.")
+                self._step['values'] = np.linspace(self._step['start'], self._step['stop'], steps+1, dtype=np.float32)
+                self._step_cache_key = cache_key
             self.dim = 2
         else:
             log.info("Couldn't generate step value list, inputs missing!")
@@ -467,12 +530,16 @@ class MeasurementScript():
             self._sweep['duration'] = abs(self._sweep['stop']-self._sweep['start'])/self._sweep['rate']
             log.info(f"Set sweep duration to {self._sweep['duration']}")
         else:
-            assert ValueError("Values for sweep missing!")
+            raise ValueError("Values for sweep missing!")
+        self._sweep_samples = None
         if (self._sweep['start'] is not None and self._sweep['stop'] is not None and self._sweep['rate'] is not None):
-            self._sweep['values'] = np.linspace(
-                self._sweep['start'],self._sweep['stop'],
-                round(self._sweep['duration']*self._lockin['sample_rate']),dtype=np.float32)
-            log.info("Generated sweep values!")
+            cache_key = (self._sweep['start'], self._sweep['stop'], self._sweep['rate'], self._lockin['sample_rate'])
+            if self._sweep['values'] is None or cache_key != self._sweep_cache_key:
+                self._sweep['values'] = np.linspace(
+                    self._sweep['start'],self._sweep['stop'],
+                    round(self._sweep['duration']*self._lockin['sample_rate']),endpoint=True,dtype=np.float32)
+                self._sweep_cache_key = cache_key
+                log.info("Generated sweep values!")
         else:
             log.error("Couldn't generate sweep value list, inputs missing!")
 
@@ -531,29 +598,24 @@ class MeasurementScript():
                 if key1 not in self._data['save'][key]:
                     self._data['save'][key].append(key1)
         for key,val in self._data['save'].items():
-            temp = str(val)
-            if 'difference' in temp:
-                for key1 in self.valids['traces']:
+            if 'difference' in val:
+                for key1 in ['trace','retrace','difference']:
                     if key1 not in self._data['temp_save'][key]:
                         self._data['temp_save'][key].append(key1)
-            elif 'retrace' in temp:
+            elif 'retrace' in val:
                 for key1 in ['trace','retrace']:
                     if key1 not in self._data['temp_save'][key]:
                         self._data['temp_save'][key].append(key1)
-            elif 'trace' in temp:
+            elif 'trace' in val:
                 if 'trace' not in self._data['temp_save'][key]:
                     self._data['temp_save'][key].append('trace')
-        for key,val in self._data['temp_save'].items():
-            if key == 'amp':
-                for key1 in val:
-                    for val1 in ['inph', 'quad']:
-                        if key1 not in self._data['temp_save'][val1]:
-                            self._data['temp_save'][val1].append(key1)
-            elif key == 'amp':
-                for key1 in val:
-                    for val1 in ['inph', 'quad']:
-                        if key1 not in self._data['temp_save'][val1]:
-                            self._data['temp_save'][val1].append(key1)
+        for key in ['amp', 'phase']:                    # amp and phase are calculated from inph and quad
+            for key1 in self._data['temp_save'][key]:
+                if key1 == 'difference':                # difference of amp/phase is taken from their traces
+                    continue
+                for val1 in ['inph', 'quad']:
+                    if key1 not in self._data['temp_save'][val1]:
+                        self._data['temp_save'][val1].append(key1)
         return self._data
 
     def add_inputs(self):
@@ -562,8 +624,8 @@ class MeasurementScript():
             if key in self.valids['inputs'] and val:
                 if key not in self._inputs['inputs']:
                     self._inputs['inputs'].append(key)
-        temp = str(self._data['temp_save'])
-        if 'retrace' in temp:
+        self._needs_retrace = any('retrace' in val for val in self._data['temp_save'].values())
+        if self._needs_retrace:
             self._inputs['retrace'] = True
 
     def set_(self,**kwargs):
@@ -585,19 +647,11 @@ class MeasurementScript():
 
     def set_hard_config(self, **kwargs):
         ''' setter function to update adwin hard config'''
-        if isinstance(kwargs,dict):
-            self.hard_config = kwargs
-            # log.warning("Hard config for Adwin was changed!")
-        else:
-            assert ValueError
+        self.hard_config = kwargs
 
     def set_soft_config(self, **kwargs):
         ''' setter function to update adwin soft config'''
-        if isinstance(kwargs,dict):
-            self.soft_config = kwargs
-            # log.warning("Soft config for adwin was changed!")
-        else:
-            assert ValueError
+        self.soft_config = kwargs
 
     def set_sweep(self, **kwargs):
         ''' setter func for sweep'''
@@ -664,22 +718,27 @@ class MeasurementScript():
                     self._lockin[key] = val
                 else:
                     log.error(f'Value of {key} must be float or integer!')
+        self._sweep_samples = None      # read again at the next sweep
 
     def set_data(self, **kwargs):
         ''' setter func for data measurement, saving and live plotting'''
-        for key,val in kwargs.items(): # keys: temp_save, save, plot
-            if key in self._data.keys(): 
-                for key1,val1 in val.items():   # keys: inph, quad, raw, amp, phase
-                    if (key1 in self.valids['calc']) or (key1 in self.valids['inputs']):
-                        for key2 in val1:       # keys: trace, retrace, difference
-                            if key2 in self.valids['traces']:
-                                self._data[key][key1].append(key2)
-                            else:
-                                log.error(f'{key2} is no valid input for {key}_{key1}!')
-                    else:
-                        log.error(f'{key1} is not defined in vars of {key}!')
+        for key in kwargs.keys() - self._data.keys():
+            log.error(f'{key} is not defined!')
+        if 'flush_interval' in kwargs:
+            if isinstance(kwargs['flush_interval'],int) and kwargs['flush_interval'] > 0:
+                self._data['flush_interval'] = kwargs['flush_interval']
             else:
-                log.error(f'{key} is not defined!')
+                log.error('Value of flush_interval must be a positive integer!')
+        valid = {}      # valid traces of kwargs, keys: temp_save, save, plot -> inph, quad, raw, amp, phase
+        for key in kwargs.keys() & {'temp_save','save','plot'}:
+            for key1 in kwargs[key].keys() - VALID_DATA:
+                log.error(f'{key1} is not defined in vars of {key}!')
+            valid[key] = {}
+            for key1 in kwargs[key].keys() & VALID_DATA:
+                for key2 in set(kwargs[key][key1]) - VALID_TRACES:
+                    log.error(f'{key2} is no valid input for {key}_{key1}!')
+                valid[key][key1] = [key2 for key2 in kwargs[key][key1] if key2 in VALID_TRACES]
+        _deep_extend(self._data, valid)
 
     def set_sph(self, **kwargs):
         ''' update all given spherical b parameters '''
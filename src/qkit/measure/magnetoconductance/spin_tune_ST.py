@@ -1,10 +1,39 @@
 ''' adjusted spin_tune class for trace measurement at ST'''
+import numpy as np
 import qkit
 from qkit.gui.notebook.Progress_Bar import Progress_Bar
 from qkit.measure.spin_suite.spin_tune import Tuning
 
 class Tuning_ST(Tuning):
 
+    def __init__(self, exp_name = "", sample = None):
+        Tuning.__init__(self, exp_name, sample)
+        self.flush_interval = 1
+
+    @property
+    def flush_interval(self):
+        return self._flush_interval
+
+    @flush_interval.setter
+    def flush_interval(self, rows):
+        """
+        Number of traces of a 2D measurement, which are buffered and written to the .h5 file at once.
+        """
+        if not isinstance(rows, int) or rows < 1:
+            raise TypeError(f"{__name__}: Cannot use {rows} as flush_interval. Must be a positive integer.")
+        self._flush_interval = rows
+
+    def _buffer_vector(self, latest_data, buffer, row):
+        for name, values in latest_data.items():
+            if name not in buffer:
+                buffer[name] = np.empty((self.flush_interval, len(values)), dtype=np.asarray(values).dtype)
+            buffer[name][row] = values
+
+    def _append_buffer(self, buffer, rows, container):
+        if rows:
+            for name, block in buffer.items():
+                container[f"{name}"].append(block[:rows])
+
     def measure1D(self,data_to_show = None):
         """
         Starts a 1D - measurement, along the x coordinate.
@@ -42,16 +71,22 @@ class Tuning_ST(Tuning):
 
         self._open_qviewkit(datasets = data_to_show)
 
+        buffer, rows = {}, 0  # traces are buffered and written as one block every flush_interval steps
         try:
             for x_val in self._x_parameter.values:
                 # x_wait = self._x_parameter.wait_time
                 self._x_parameter.set_function(x_val)
                 self._acquire_log_functions()
                 latest_trace = self.multiplexer.measure()
-                self._append_vector(latest_trace, self._datasets, direction = 1)
+                self._buffer_vector(latest_trace, buffer, rows)
+                rows += 1
+                if rows == self.flush_interval:
+                    block, rows = rows, 0   # reset first, finally must not write this block again
+                    self._append_buffer(buffer, block, self._datasets)
                 pb.iterate(addend = 1)
                 if self.watchdog.stop: break 
 
         finally:
+            self._append_buffer(buffer, rows, self._datasets)
             self.watchdog.reset()
             self._end_measurement()
\ No newline at end of file
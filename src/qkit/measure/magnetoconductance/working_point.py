@@ -18,7 +18,7 @@ __all__ = ['VectorMagnet3D', 'WorkingPoint']
 __version__ = '0.1_20240515'
 __author__ = 'Luca Kosche'
 
-from numpy import cos, sin, pi, NaN
+from numpy import cos, sin, pi, NaN, full
 
 class MagnetUnderdefinedError(Exception):
     """ Error which is thrown when the VectorMagnet has not enough
@@ -158,7 +158,9 @@ class WorkingPoint(VectorMagnet3D):
         values for the outputs of the coils.
         If magnet="vector3d" the channels "bx", "by", "bz" must be
         configured as output channels. When asking for the outputs with
-        property "outs", the cartesian fields will be calculated '''
+        property "outs", the cartesian fields will be calculated.
+        The property "outs_array" holds the same values as numpy array in
+        the order of output_names (for vectorized calculations). '''
     def __init__(self, output_names, wp=None, magnet='cartesian'):
         if magnet in ['cartesian', 'vector3d']:
             self._magnet = magnet
@@ -167,6 +169,9 @@ class WorkingPoint(VectorMagnet3D):
         if magnet == 'vector3d':
             super().__init__(mode='sweep')
         self._outputs = {key: NaN for key in output_names}
+        # array of the output values, kept in lockstep with self._outputs
+        self._index = {key: idx for idx, key in enumerate(self._outputs)}
+        self._outputs_array = full(len(self._outputs), NaN)
         if wp is not None:
             self.set_wp(**wp)
         self._create_properties(output_names)
@@ -178,11 +183,19 @@ class WorkingPoint(VectorMagnet3D):
             self.set_b(self.calc_cartesian())
         return self._outputs
 
+    @property
+    def outs_array(self):
+        ''' the outputs property as array in the order of the output names '''
+        if self._magnet == 'vector3d':
+            self.set_b(self.calc_cartesian())
+        return self._outputs_array
+
     def set_out(self, name: str, value: float):
         ''' setter function for output "name" '''
         if self._magnet == 'vector3d' and name in ['bx', 'by', 'bz']:
             print(f'WARNING: vector3D will overwrite {name}!' )
         self._outputs[name] = value
+        self._outputs_array[self._index[name]] = value
 
     def get_out(self, name: str):
         ''' getter function for output "name" '''
@@ -203,6 +216,7 @@ class WorkingPoint(VectorMagnet3D):
         for idx, val in enumerate(b_fields):
             name = bdict[str(idx)]
             self._outputs[name] = val
+            self._outputs_array[self._index[name]] = val
 
     def set_mode(self, mode):
         ''' set mode of working point (normal/sweep)'''
@@ -4,15 +4,76 @@
 #
 #
 
+import functools
 import inspect
+import logging
+import os
+import re
 import time
-import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
 import qkit
-from qkit.storage import store as hdf
 from qkit.measure.measurement_class import Measurement
-import qkit.measure.write_additional_files as waf
-from qkit.gui.plot import plot as qviewkit
+
+# file names drop blanks and replace commas by underscores
+_file_name_re = re.compile(r'[ ,]')
+
+
+def _file_name_sub(match):
+    return '_' if match.group() == ',' else ''
+
+
+# plots are saved in the background, while the next measurement can already run
+_plot_executor = ThreadPoolExecutor(max_workers=2)
+
+
+def _choose_chunks(shape, itemsize, target_bytes=1 << 20, min_chunks=None, min_bytes=1 << 14):
+    """
+    Chunk shape of roughly <target_bytes> that spans the fastest varying (trailing) axes first. The slowest axes are
+    shrunk until the dataset consists of at least <min_chunks> chunks (default: number of cores), as long as the chunks
+    stay larger than <min_bytes>.
+    """
+    if min_chunks is None:
+        min_chunks = os.cpu_count() or 1
+    chunks = [1] * len(shape)
+    nbytes = itemsize
+    for axis in reversed(range(len(shape))):
+        if nbytes * shape[axis] <= target_bytes:
+            chunks[axis] = shape[axis]
+            nbytes *= shape[axis]
+        else:
+            chunks[axis] = max(1, target_bytes // nbytes)
+            break
+
+    def n_chunks(chunks):
+        return np.prod([-(-n // c) for n, c in zip(shape, chunks)])
+
+    axis = 0
+    while axis < len(shape) and n_chunks(chunks) < min_chunks:
+        if chunks[axis] == 1:
+            axis += 1
+            continue
+        smaller = (chunks[axis] + 1) // 2
+        if itemsize * np.prod(chunks) // chunks[axis] * smaller < min_bytes:
+            break
+        chunks[axis] = smaller
+    logging.debug(f'QmQkitWrapper: chunks {tuple(chunks)} for shape {tuple(shape)} ({n_chunks(chunks)} chunks)')
+    return tuple(chunks)
+
+
+def _write_chunks(ds, values, dtype, step):
+    """
+    Casts <values> to <dtype> in C-order and writes them to the dataset <ds> in slices of <step> along the first axis,
+    aligned to the chunk boundaries to avoid read-modify-write of partially touched chunks.
+    The cast runs in parallel for several datasets (numpy releases the GIL), the writes are serialized by h5py.
+    """
+    # cast to the storage dtype and C-order within a single copy (no copy if both already fit)
+    values = np.ascontiguousarray(values, dtype=dtype)
+    for i0 in range(0, values.shape[0], step):
+        sel = np.s_[i0:i0 + step]
+        ds.write_direct(values, source_sel=sel, dest_sel=sel)
 
 
 class QmQkitWrapper:
@@ -32,18 +93,37 @@ class QmQkitWrapper:
         # data
         self.coords = {}
         self.values = {}
+        # storage dtype by kind of the values (numpy dtype.kind), all other kinds are stored as float32
+        self.dtype_policy = {'f': 'float32', 'c': 'complex64'}
+
+        # large datasets are prepared and written in the background, one worker per dataset. The data file stays
+        # open until the writes are done, close_files waits for them at the next save or at the end of a series.
+        self._writer = None
+        self._pending_writes = []
+        self._data_file = None
+        self._plot_future = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close_files()
+        self._collect_plots()
 
 
     # Decorator to start qkit
     def measure(func):
+        source = []  # source code of func, looked up on the first save
+
+        @functools.wraps(func)
         def wrapper(self, *args, **kwargs):
 
-            save = False
-            if 'save' in kwargs:
-                save = kwargs['save']
-                kwargs.pop('save', None)
+            save = kwargs.pop('save', False)
 
             if save:
+                # finish the file of the previous measurement, its plots are saved while this one runs
+                self._collect_plots()
+                self.close_files()
                 qkit.flow.start()
 
             output = func(self, *args, **kwargs)
@@ -53,26 +133,21 @@ class QmQkitWrapper:
                     self._file_name = 'QM_experiment_' + self.exp_name + '_' + self.dirname
                 else:
                     self._file_name = 'QM_experiment_' + self.exp_name
-                self._file_name = self._file_name.replace(' ', '').replace(',', '_')
+                self._file_name = _file_name_re.sub(_file_name_sub, self._file_name)
 
                 # Save function arguments and qm program
-                astring = ""
-                for value in args:
-                    astring += "{}, ".format(value)
-
-                kstring = ""
-                for key, value in kwargs.items():
-                    kstring += "{} = {}, ".format(key, value)
-
-                self.sourcecode = astring + kstring + "\n\n\n" + inspect.getsource(func)
+                if not source:
+                    source.append(inspect.getsource(func))
+                astring = "".join("{}, ".format(value) for value in args)
+                kstring = "".join("{} = {}, ".format(key, value) for key, value in kwargs.items())
+                self.sourcecode = astring + kstring + "\n\n\n" + source[0]
 
                 self._prepare_measurement_file()
                 self.store_data()
 
                 qkit.flow.end()
 
-                self.close_files()
-
+                # the values are written in the background, the file is closed at the next save or by close_files
                 print('Measurement complete: {:s}'.format(self._data_file.get_filepath()))
 
             else:
@@ -86,8 +161,11 @@ class QmQkitWrapper:
         creates the output .h5-file with distinct dataset structures for each measurement type.
         at this point all measurement parameters are known and put in the output file
         '''
+        # storage is only needed when data is saved, import it here to keep the import of the wrapper light
+        from qkit.storage import store as hdf
+        import qkit.measure.write_additional_files as waf
 
-        self._data_file = hdf.Data(name=self._file_name, mode='a')
+        self._data_file = hdf.Data(name=self._file_name, mode='a', chunk_cache=64 * 1024 * 1024)
         self._measurement_object.uuid = self._data_file._uuid
         self._measurement_object.hdf_relpath = self._data_file._relpath
         self._measurement_object.instruments = qkit.instruments.get_instrument_names()
@@ -105,56 +183,95 @@ class QmQkitWrapper:
 
 
     def close_files(self):
-
-        # save plots and close files
-        # t = threading.Thread(target=qviewkit.save_plots, args=[self._data_file.get_filepath()])
-        # t.start()
-
-        self._data_file.flush()
-        self._data_file.close_file()
-        waf.close_log_file(self._log_file)
+        """
+        Waits for the background writes of the last saved measurement, closes its files and starts saving the plots.
+        Called at the next save, call it (or use the wrapper as context manager) after the last measurement of a series.
+        """
+        if self._data_file is None:
+            return
+
+        import qkit.measure.write_additional_files as waf
+        from qkit.gui.plot import plot as qviewkit
+
+        pending, self._pending_writes = self._pending_writes, []
+        writer, self._writer = self._writer, None
+        try:
+            # wait for all background writes, then re-raise the first error
+            errors = [future.exception() for future in pending]
+            for error in errors:
+                if error is not None:
+                    raise error
+            # save plots
+            self._plot_future = _plot_executor.submit(qviewkit.save_plots, self._data_file.get_filepath())
+        finally:
+            # close files, also if a background write failed
+            if writer is not None:
+                writer.shutdown()
+            self._data_file.flush()
+            self._data_file.close_file()
+            waf.close_log_file(self._log_file)
+            self._data_file = None
 
         # TODO open qkit
         # if self.qviewkit_singleInstance and self.open_qviewkit and self._qvk_process:
         #    self._qvk_process.terminate()  # terminate an old qviewkit instance
 
 
-    def store_data(self):
+    def _collect_plots(self):
         """
+        Waits for the plots of the previous measurement to be saved.
+        """
+        if self._plot_future is not None:
+            try:
+                self._plot_future.result()
+            except Exception as e:
+                logging.error(f'QmQkitWrapper: Saving plots failed: {e}')
+            self._plot_future = None
 
+    def store_data(self):
+        """
+        Adds coordinates and values to the data file. The values of matrices and boxes are written by a background
+        thread, the returned futures are awaited in close_files at the next save.
         """
         coord_dic = {}
 
-        for key in self.coords:
-            coord_vec = self.coords[key][0]
-            unit = self.coords[key][1]
-
+        for key, (coord_vec, unit) in self.coords.items():
             coords_file = self._data_file.add_coordinate(key, unit=unit)
             coords_file.add(coord_vec)
             coord_dic[key] = coords_file
 
-        for key in self.values:
-            values = self.values[key][0]
-            coord_key_list = self.values[key][1]
-            unit = self.values[key][2]
-
-            if len(coord_key_list) == 1:
-                value_file = self._data_file.add_value_vector(key, x=coord_dic[coord_key_list[0]], unit=unit)
-                value_file.append(values)
-            elif len(coord_key_list) == 2:
-                value_file = self._data_file.add_value_matrix(key, x=coord_dic[coord_key_list[0]],
-                                                              y=coord_dic[coord_key_list[1]], unit=unit)
-                # file initialization - workaround
-                value_file.append(values[0, :])
-            elif len(coord_key_list) == 3:
-                value_file = self._data_file.add_value_box(key, x=coord_dic[coord_key_list[0]],
-                                                           y=coord_dic[coord_key_list[1]],
-                                                           z=coord_dic[coord_key_list[2]], unit=unit)
-                # file initialization - workaround
-                value_file.append(values[0, 0, :])
-
-            value_file.ds.resize(values.shape)
-            value_file.ds[:] = values
+        # dataset type by number of coordinates
+        add_value = {1: self._data_file.add_value_vector,
+                     2: self._data_file.add_value_matrix,
+                     3: self._data_file.add_value_box}
+
+        writes = []
+        for key, (values, coord_key_list, unit) in self.values.items():
+            rank = len(coord_key_list)
+            axes = {axis: coord_dic[coord_key] for axis, coord_key in zip(('x', 'y', 'z'), coord_key_list)}
+            values = np.asarray(values)
+            dtype = self.dtype_policy.get(values.dtype.kind, 'float32')
+
+            if rank == 1:
+                add_value[rank](key, unit=unit, dtype=dtype, **axes).append(values)
+                continue
+
+            # h5py needs C-contiguous data, e.g. transposed arrays would be copied silently for every slice
+            if not values.flags.c_contiguous:
+                logging.info(f'QmQkitWrapper: copy non C-contiguous values of {key} before writing')
+
+            # explicit chunks of ~1 MB along the fastest varying axes, lossless compression
+            chunks = _choose_chunks(values.shape, np.dtype(dtype).itemsize)
+            # all metadata operations are done here, datasets are created at their final shape (no append/resize,
+            # no flush) and only the h5py dataset handle is passed on to the writers
+            ds = add_value[rank](key, unit=unit, dtype=dtype, shape=values.shape, chunks=chunks,
+                                 compression='lzf', shuffle=True, **axes).ds
+            writes.append((ds, values, dtype, chunks[0]))
+
+        # the writer lives until close_files, at most 4 threads as the writes are serialized by h5py anyway
+        if writes:
+            self._writer = ThreadPoolExecutor(max_workers=min(4, len(writes)))
+            self._pending_writes = [self._writer.submit(_write_chunks, *write) for write in writes]
 
         # source code
         sourcecode_file = self._data_file.add_textlist('sourcecode')
@@ -164,5 +281,7 @@ class QmQkitWrapper:
         if self.comment:
             self._data_file.add_comment(self.comment)
 
+        return self._pending_writes
+
 
 
@@ -23,6 +23,7 @@ from zmq.auth.thread import ThreadAuthenticator
 import logging
 from qkit.services.qplexkit.qplexkit import qplexkit
 from qkit.config.services import cfg
+import pickle
 import re
 
 ##################################################
@@ -52,6 +53,23 @@ msg2cmd = {'set_switch_time': qpk.set_switch_time,
            'ping': lambda *args, **kwargs: 'pong',
            }
 
+
+def get_codec(codec):
+    ''' returns the functions to receive a request from and send an answer to a socket with the encoding <codec> '''
+    if codec == 'pickle':  # only for trusted clients, as pickle can execute arbitrary code
+        recv = lambda sock: pickle.loads(sock.recv(copy=False).buffer)
+        send = lambda sock, ans: sock.send(pickle.dumps(ans, protocol=pickle.HIGHEST_PROTOCOL), copy=False)
+    elif codec == 'msgpack':
+        import msgspec
+        encoder, decoder = msgspec.msgpack.Encoder(), msgspec.msgpack.Decoder()
+        recv = lambda sock: decoder.decode(sock.recv(copy=False).buffer)
+        send = lambda sock, ans: sock.send(encoder.encode(ans), copy=False)
+    else:  # json fallback for older clients
+        recv = lambda sock: sock.recv_json()
+        send = lambda sock, ans: sock.send_json(ans)
+    return recv, send
+
+
 ''' run zmq-server '''
 if __name__ == "__main__":
     context = zmq.Context()
@@ -63,13 +81,29 @@ if __name__ == "__main__":
     socket = context.socket(zmq.REP)
     socket.zap_domain = b'global'
     socket.bind(f'''tcp://*:{cfg['qplexkit']['server_port']}''')
+    ''' pickle is refused on the tcp-socket, unless explicitly allowed '''
+    codec = cfg['qplexkit'].get('codec', 'json')
+    if codec == 'pickle' and not cfg['qplexkit'].get('tcp_pickle', False):
+        raise ValueError('qplexkit: codec "pickle" over tcp allows remote code execution, use "msgpack" or "json" '
+                         'or set cfg["qplexkit"]["tcp_pickle"] = True in a trusted network')
+    codecs = {socket: get_codec(codec)}
+    poller = zmq.Poller()
+    poller.register(socket, zmq.POLLIN)
+    ''' local clients connect via ipc, that is protected by file permissions instead of the authenticator '''
+    if cfg['qplexkit'].get('ipc_path'):
+        ipc_socket = context.socket(zmq.REP)
+        ipc_socket.bind(f"ipc://{cfg['qplexkit']['ipc_path']}")
+        poller.register(ipc_socket, zmq.POLLIN)
+        codecs[ipc_socket] = get_codec(cfg['qplexkit'].get('ipc_codec', codec))
 
     while True:
-        try:
-            fun, args, kwargs = socket.recv_json()
-            socket.send_json(msg2cmd[fun](*args, **kwargs))
-        except Exception as e:
-            socket.send_json((e.__class__.__name__, *e.args))
+        for sock, _ in poller.poll():
+            recv, send = codecs[sock]
+            try:
+                fun, args, kwargs = recv(sock)
+                send(sock, msg2cmd[fun](*args, **kwargs))
+            except Exception as e:
+                send(sock, (e.__class__.__name__, *e.args))
 
 
 ###################################################
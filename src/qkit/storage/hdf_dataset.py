@@ -46,6 +46,11 @@ class hdf_dataset(object):
         self.z_object = z
         self.dim = meta.get('dim', None)
         self.dtype = meta.get('dtype','f')
+        self.chunks = meta.get('chunks', None)
+        self.compression = meta.get('compression', None)
+        self.shuffle = meta.get('shuffle', False)
+        self.shape = meta.get('shape', None)
+        self.maxshape = meta.get('maxshape', None)
         self.ds_type = ds_type
         self._next_matrix = False
         self._save_timestamp = save_timestamp
@@ -56,6 +61,9 @@ class hdf_dataset(object):
             raise NameError
         if name:
             self._new_ds_defaults(name, unit, folder, comment)
+            if self.shape is not None:
+                ## the final shape is already known, no need to postpone the creation
+                self._create_ds(self.shape[-1])
         elif ds_url:
             self._read_ds_from_hdf(ds_url)
 
@@ -100,8 +108,9 @@ class hdf_dataset(object):
         """Function to save a growing measurement dataset to the hdf file.
         
         Data is added one datapoint (vector) or one dataline (matrix, box) at a
-        time. The data is cast to numpy arrays if possible and appended to the
-        existing dataset. A timestamp-dataset is also recorded here.
+        time. A matrix also accepts a block of datalines as 2dim array. The data
+        is cast to numpy arrays if possible and appended to the existing
+        dataset. A timestamp-dataset is also recorded here.
 
         Args:
             data: any data to be appended to the dataset
@@ -119,30 +128,42 @@ class hdf_dataset(object):
             data = numpy.atleast_1d(numpy.array(data,dtype=self.dtype))
         # at this point the reference data should be around
         if self.first:
-            self.first = False
             if self.ds_type == ds_types['txt']:
                 tracelength = 0
             else:
-                tracelength = len(data)
-            ## tracelength is used so far only for multi-dimensional datasets to chunk needed memory
-            
-            self.ds = self.hf.create_dataset(self.name,tracelength,
-                                             folder=self.folder,
-                                             dim = self.dim,
-                                             ds_type = self.ds_type,
-                                             dtype = self.dtype)
-            self._setup_metadata()
-            if self._save_timestamp:
-                self._create_timestamp_ds()
+                tracelength = data.shape[-1]
+            self._create_ds(tracelength)
 
         self.hf.append(self.ds, data, next_matrix=self._next_matrix, reset=reset, pointwise=pointwise)
         if self._save_timestamp:
-            self.hf.append(self.ds_ts, numpy.array([time.time()]), next_matrix=self._next_matrix, reset=reset)
+            rows = data.shape[0] if self.ds_type != ds_types['txt'] and data.ndim == 2 else 1
+            self.hf.append(self.ds_ts, numpy.full(rows, time.time()), next_matrix=self._next_matrix, reset=reset)
         if self._next_matrix:
             self._next_matrix = False
 
         self.hf.flush()
             
+    def _create_ds(self, tracelength):
+        """Creates the h5py dataset and sets up its metadata.
+        
+        tracelength is used so far only for multi-dimensional datasets to chunk
+        needed memory.
+        """
+        self.first = False
+        self.ds = self.hf.create_dataset(self.name,tracelength,
+                                         folder=self.folder,
+                                         dim = self.dim,
+                                         ds_type = self.ds_type,
+                                         dtype = self.dtype,
+                                         chunks = self.chunks,
+                                         compression = self.compression,
+                                         shuffle = self.shuffle,
+                                         shape = self.shape,
+                                         maxshape = self.maxshape)
+        self._setup_metadata()
+        if self._save_timestamp:
+            self._create_timestamp_ds()
+
     def add(self,data):
         """Function to save a 1dim dataset once.
         
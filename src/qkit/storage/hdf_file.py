@@ -32,11 +32,12 @@ class H5_file(object):
     trick of placing added data in the correct position in the dataset.
     """    
     
-    def __init__(self,output_file, mode,**kw):
+    def __init__(self,output_file, mode, chunk_cache = None, **kw):
         """Inits the H5_file at the path 'output_file' with the access mode
-        'mode'
+        'mode'. 'chunk_cache' optionally sets the size of the raw data chunk
+        cache in bytes.
         """
-        self.create_file(output_file, mode)
+        self.create_file(output_file, mode, chunk_cache)
         self.newfile = False
         
         if self.hf.attrs.get("qt-file",None) or self.hf.attrs.get("qkit",None):
@@ -51,8 +52,11 @@ class H5_file(object):
             for k in kw:
                 self.grp.attrs[k] = kw[k]
         
-    def create_file(self,output_file, mode):
-        self.hf = h5py.File(output_file, mode,**file_kwargs )
+    def create_file(self,output_file, mode, chunk_cache = None):
+        kwargs = dict(file_kwargs)
+        if chunk_cache is not None:
+            kwargs['rdcc_nbytes'] = chunk_cache
+        self.hf = h5py.File(output_file, mode,**kwargs )
 
     def set_base_attributes(self):
         "stores some attributes and creates the default data group"
@@ -86,7 +90,8 @@ class H5_file(object):
         self.vgrp = self.entry.require_group("views")
         
     def create_dataset(self,name, tracelength, ds_type = ds_types['vector'],
-                       folder = "data", dim = 1,  **kwargs):
+                       folder = "data", dim = 1, chunks = None, compression = None,
+                       shuffle = False, shape = None, maxshape = None, **kwargs):
         """Dataset for one, two, and three dimensional data
         
             Args:
@@ -101,28 +106,46 @@ class H5_file(object):
             
                 'folder' is a optional group relative to the default group
             
+                'chunks' optional chunk shape, overrides the default chunking
+            
+                'compression', 'shuffle' optional filters passed on to h5py
+            
+                'shape', 'maxshape' optional final shape of the dataset, if it is
+                already known at creation (no append/resize needed)
+            
                 'kwargs' are appended as attributes to the dataset
         """
         self.ds_type = ds_type
         
+        fill = [0,0,0]
         if dim == 1:
-            shape    = (0,)
-            maxshape = (None,)
-            chunks=True
+            default_shape    = (0,)
+            default_maxshape = (None,)
+            default_chunks = True
             
         elif dim == 2:
-            shape    = (0,0)
-            maxshape = (None,None)
-            chunks=(5, tracelength)
+            default_shape    = (0,0)
+            default_maxshape = (None,None)
+            default_chunks = (5, tracelength)
             
         elif dim == 3:
-            shape    = (0,0,0)
-            maxshape = (None,None,None)
-            chunks=(5, 5, tracelength)
+            default_shape    = (0,0,0)
+            default_maxshape = (None,None,None)
+            default_chunks = (5, 5, tracelength)
             
         else:
             logging.error("Create datasets: '%s' is wrong number of dims." %(dim))
             raise ValueError
+        if chunks is None:
+            chunks = default_chunks
+        if maxshape is None:
+            maxshape = default_maxshape
+        final_shape = shape is not None
+        if not final_shape:
+            shape = default_shape
+        elif dim > 1:
+            ## dataset is created at its final size, i.e. completely filled
+            fill = [shape[0], shape[1], 0]
 
         if folder == "data":
             self.grp = self.dgrp
@@ -161,18 +184,24 @@ class H5_file(object):
         if ds_type == ds_types['txt']:
             ds = self.grp.create_dataset(name, shape, maxshape=maxshape, chunks = chunks, dtype=dtype)
         else:
-            ds = self.grp.create_dataset(name, shape, maxshape=maxshape, chunks = chunks, dtype=dtype, fillvalue = np.nan)
+            # the fill value has to be of the dataset type, e.g. complex datasets need a complex nan
+            fillvalue = np.array(np.nan).astype(dtype)
+            ds = self.grp.create_dataset(name, shape, maxshape=maxshape, chunks = chunks, dtype=dtype, fillvalue = fillvalue,
+                                         compression = compression, shuffle = shuffle)
         
         ds.attrs.create("name",name.encode())
         ds.attrs.create("ds_type", ds_type)
         if ds_type == ds_types['matrix'] or ds_type == ds_types['box']:
             ## fill value only needed for >1D datasets
-            ds.attrs.create("fill", [0,0,0])
+            ds.attrs.create("fill", fill)
         # add attibutes
         for a in kwargs:
              ds.attrs.create(a,(kwargs[a]).encode())
-             
-        self.flush()
+        
+        ## growing datasets are flushed to be visible for live plotting, datasets
+        ## created at their final shape are written at once and flushed afterwards
+        if not final_shape:
+            self.flush()
         return ds
         
     def append(self,ds,data, next_matrix=False, reset=False, pointwise=False):
@@ -180,6 +209,7 @@ class H5_file(object):
         
         A simple append method for data traces.
         Reshapes the array and updates the attributes.
+        A 2dim array appended to a matrix adds several data series at once.
         The optional 'next_matrix' atrribute arranges the incoming data in a 
         value_box correctly.
         
@@ -234,7 +264,14 @@ class H5_file(object):
             ## multiple inputs: list/np.array with one or multiple entries
             fill = ds.attrs.get('fill')
             dim1 = ds.shape[1]
-            if len(data) == 1 and pointwise:
+            if data.ndim == 2 and not reset:
+                ## block of data series, written with a single resize
+                dim0 = ds.shape[0]
+                fill[0] += data.shape[0]
+                fill[1] = data.shape[1]
+                ds.resize((dim0+data.shape[0],data.shape[1]))
+                ds[dim0:,:] = data
+            elif len(data) == 1 and pointwise:
                 dim0 = max(1, ds.shape[0])
                 ## single entry; sorting like in the 'len(ds.shape) == 3' case
                 if next_matrix:
@@ -32,7 +32,7 @@ class Data(object):
     mentioned classes.
     """
     # a types
-    def __init__(self, name = None, mode = 'r+', copy_file = False):
+    def __init__(self, name = None, mode = 'r+', copy_file = False, chunk_cache = None):
         """Creates an empty data set including the file, for which the currently
         set file name generator is used or opens the h5 file at location 'name'.
 
@@ -40,6 +40,8 @@ class Data(object):
             name (string):  filename or absolute filepath
             mode (string):  access mode to the hdf5 file, default: 'r+' (read+write).
                 Other modes are 'a' (read, write, and create)
+            chunk_cache (int):  optional size of the raw data chunk cache in bytes,
+                default: h5py default (1 MB)
         """
         self._name = name
         if os.path.isfile(self._name):
@@ -56,7 +58,7 @@ class Data(object):
             self._folder,self._filename = os.path.split(self._filepath)
         "setup the  file"
         try:
-            self.hf = H5_file(self._filepath, mode)
+            self.hf = H5_file(self._filepath, mode, chunk_cache=chunk_cache)
         except IOError:
             raise IOError('File does not exist. Use argument \"mode=\'a\'\" to create a new h5 file.')
         if self.hf.newfile:
@@ -238,6 +240,9 @@ class Data(object):
             unit: Optional string.
             comment: Optional string to put in any comment.
             folder: Optional string ('data' or 'analysis').
+            meta: Optional 'chunks', 'compression' and 'shuffle' are passed on
+                to h5py when the dataset is created. If the final 'shape' (and
+                'maxshape') is given, the dataset is created right away.
         
         Returns:
             hdf_dataset object.
@@ -262,6 +267,9 @@ class Data(object):
             unit: Optional string.
             comment: Optional string to put in any comment.
             folder: Optional string ('data' or 'analysis').
+            meta: Optional 'chunks', 'compression' and 'shuffle' are passed on
+                to h5py when the dataset is created. If the final 'shape' (and
+                'maxshape') is given, the dataset is created right away.
         
         Returns:
             hdf_dataset object.